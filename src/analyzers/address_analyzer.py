@@ -5,9 +5,17 @@
 """
 
 import logging
-from typing import List, Dict, Any, Optional
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import chain, groupby
+from operator import itemgetter
+from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
-import pandas as pd
+import numpy as np
 from clickhouse_driver import Client
 
 logger = logging.getLogger(__name__)
@@ -15,24 +23,233 @@ logger = logging.getLogger(__name__)
 class AddressAnalyzer:
     """以太坊地址分析器 - 提供全面的地址分析功能"""
 
-    def __init__(self, clickhouse_config: Dict[str, Any]):
+    # 分析查询通用的ClickHouse设置：按序聚合，超大GROUP BY落盘而非OOM
+    _QUERY_SETTINGS = {
+        'optimize_aggregation_in_order': 1,
+        'max_bytes_before_external_group_by': 5000000000
+    }
+
+    # 服务端数据块大小与流式读取的批大小保持一致
+    _STREAM_CHUNK_SIZE = 16384
+
+    # 活动模式缓存的最大条目数，超出时淘汰最早写入的条目
+    _PATTERN_CACHE_MAX_SIZE = 10000
+
+    # 查询语句在类加载时构建一次，调用时只传参数
+
+    # 指定时间范围：每笔交易展开为收款方/付款方两条记录，只需扫描一次 transactions 表
+    _TOP_ADDR_SQL_TIMED = """
+        SELECT
+            leg.1 as address,
+            sum(leg.2) - sum(leg.3) as net_value,
+            sum(leg.2) as total_received,
+            sum(leg.3) as total_sent
+        FROM transactions
+        ARRAY JOIN [
+            (assumeNotNull(to_address), value, toDecimal128(0, 0)),
+            (from_address, toDecimal128(0, 0), value)
+        ] as leg
+        WHERE leg.1 != ''
+            AND transaction_timestamp >= %(start_time)s
+        GROUP BY address
+        ORDER BY net_value DESC
+        LIMIT %(limit)s
+    """
+
+    # 全量统计直接读取由物化视图维护的 address_stats 表，
+    # SummingMergeTree 的后台合并是异步的，仍需按地址再聚合一次
+    _TOP_ADDR_SQL_NO_TIME = """
+        SELECT
+            address,
+            received - sent as net_value,
+            sum(total_received) as received,
+            sum(total_sent) as sent
+        FROM address_stats
+        GROUP BY address
+        ORDER BY net_value DESC
+        LIMIT %(limit)s
+    """
+
+    # 转出/转入拆成两个分支，分别命中 by_from / by_to 投影；
+    # 自转账只由转出分支计入一次
+    _ACTIVITY_PATTERN_SQL = """
+        SELECT
+            toStartOfHour(transaction_timestamp) as hour,
+            count() as tx_count,
+            sum(is_out) as out_tx_count,
+            sum(is_in) as in_tx_count,
+            sumIf(value, is_out = 1) as out_value,
+            sumIf(value, is_in = 1) as in_value
+        FROM (
+            SELECT
+                transaction_timestamp,
+                value,
+                toUInt8(1) as is_out,
+                toUInt8(assumeNotNull(to_address) = %(address)s) as is_in
+            FROM transactions
+            PREWHERE from_address = %(address)s
+            WHERE transaction_timestamp >= %(start_time)s
+            UNION ALL
+            SELECT
+                transaction_timestamp,
+                value,
+                toUInt8(0) as is_out,
+                toUInt8(1) as is_in
+            FROM transactions
+            PREWHERE to_address = %(address)s
+            WHERE transaction_timestamp >= %(start_time)s
+                AND from_address != %(address)s
+        )
+        GROUP BY hour
+        ORDER BY hour
+    """
+
+    _BATCH_ACTIVITY_PATTERN_SQL = """
+        SELECT
+            address,
+            toStartOfHour(transaction_timestamp) as hour,
+            count() as tx_count,
+            sum(is_out) as out_tx_count,
+            sum(is_in) as in_tx_count,
+            sumIf(value, is_out = 1) as out_value,
+            sumIf(value, is_in = 1) as in_value
+        FROM (
+            SELECT
+                from_address as address,
+                transaction_timestamp,
+                value,
+                toUInt8(1) as is_out,
+                toUInt8(assumeNotNull(to_address) = from_address) as is_in
+            FROM transactions
+            PREWHERE from_address IN %(addresses)s
+            WHERE transaction_timestamp >= %(start_time)s
+            UNION ALL
+            SELECT
+                assumeNotNull(to_address) as address,
+                transaction_timestamp,
+                value,
+                toUInt8(0) as is_out,
+                toUInt8(1) as is_in
+            FROM transactions
+            PREWHERE to_address IN %(addresses)s
+            WHERE transaction_timestamp >= %(start_time)s
+                AND to_address != from_address
+        )
+        GROUP BY address, hour
+        ORDER BY address, hour
+    """
+
+    # 候选地址从 address_stats 读取，避免对 transactions 的多次全表扫描
+    _SIMILAR_CANDIDATES_SQL = """
+        WITH (
+            SELECT sum(total_transactions)
+            FROM address_stats
+            WHERE address = %(address)s
+        ) as target_count
+        
+        SELECT 
+            address,
+            sum(total_transactions) as tx_count,
+            abs(tx_count - target_count) / target_count as difference
+        FROM address_stats
+        WHERE address != %(address)s
+        GROUP BY address
+        HAVING tx_count >= target_count * 0.5
+            AND tx_count <= target_count * 1.5
+        ORDER BY difference ASC
+        LIMIT %(limit)s
+    """
+
+    def __init__(self,
+                 clickhouse_config: Dict[str, Any],
+                 analysis_config: Optional[Dict[str, Any]] = None):
         """初始化分析器
 
         Args:
             clickhouse_config: ClickHouse数据库配置
+            analysis_config: 分析配置，即 Settings.get_analysis_config() 的返回值
         """
-        self.clickhouse_client = Client(
-            host=clickhouse_config.get('host'),
-            port=clickhouse_config.get('port'),
-            user=clickhouse_config.get('user'),
-            password=clickhouse_config.get('password'),
-            database=clickhouse_config.get('database')
-        )
+        analysis_config = analysis_config or {}
+        self._cache_enabled = analysis_config.get('cache_enabled', True)
+        self._cache_ttl = analysis_config.get('cache_ttl', 3600)
+        # (地址, 时间窗口秒数) -> (写入时间, 活动模式)，按写入时间排序
+        self._pattern_cache: 'OrderedDict[Tuple[str, int], Tuple[float, Dict[str, Any]]]' = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+        # 连接池：clickhouse-driver 的 Client 不是线程安全的，每个线程独占一个
+        self._max_workers = analysis_config.get('max_workers', 4)
+        self._clients = [
+            Client(
+                host=clickhouse_config.get('host'),
+                port=clickhouse_config.get('port'),
+                user=clickhouse_config.get('user'),
+                password=clickhouse_config.get('password'),
+                database=clickhouse_config.get('database'),
+                compression='lz4',
+                settings={'max_block_size': self._STREAM_CHUNK_SIZE}
+            )
+            for _ in range(self._max_workers)
+        ]
+        self._pool: queue.Queue = queue.Queue()
+        for client in self._clients:
+            self._pool.put(client)
+        # 与连接池同样大小的线程池，在实例生命周期内复用
+        self._executor = ThreadPoolExecutor(max_workers=self._max_workers)
 
     def close(self):
         """关闭数据库连接"""
-        if self.clickhouse_client:
-            self.clickhouse_client = None
+        self._executor.shutdown(wait=True)
+        for client in self._clients:
+            client.disconnect()
+        with self._cache_lock:
+            self._pattern_cache.clear()
+
+    @contextmanager
+    def _client(self):
+        """从连接池借出一个客户端，用完归还
+
+        查询中途出错时（例如流式结果未读完）连接可能仍处于执行状态，
+        先断开连接再归还，下次使用时会自动重连。
+        """
+        client = self._pool.get()
+        try:
+            yield client
+        except BaseException:
+            client.disconnect()
+            raise
+        finally:
+            self._pool.put(client)
+
+    def _get_cached_pattern(self, key: Tuple[str, int]) -> Optional[Dict[str, Any]]:
+        """读取未过期的活动模式缓存，返回副本以免调用方修改缓存内容"""
+        if not self._cache_enabled:
+            return None
+        with self._cache_lock:
+            entry = self._pattern_cache.get(key)
+            if entry is None:
+                return None
+            cached_at, pattern = entry
+            if time.monotonic() - cached_at >= self._cache_ttl:
+                self._pattern_cache.pop(key, None)
+                return None
+            return dict(pattern)
+
+    def _cache_pattern(self, key: Tuple[str, int], pattern: Dict[str, Any]):
+        """写入活动模式缓存，并清理过期及超出容量的条目"""
+        if not self._cache_enabled:
+            return
+        now = time.monotonic()
+        with self._cache_lock:
+            self._pattern_cache[key] = (now, dict(pattern))
+            self._pattern_cache.move_to_end(key)
+            # 条目按写入时间排序，过期条目都在头部
+            while self._pattern_cache:
+                cached_at, _ = next(iter(self._pattern_cache.values()))
+                if now - cached_at < self._cache_ttl:
+                    break
+                self._pattern_cache.popitem(last=False)
+            while len(self._pattern_cache) > self._PATTERN_CACHE_MAX_SIZE:
+                self._pattern_cache.popitem(last=False)
 
     def get_top_addresses_by_value(self, 
                                  limit: int = 10, 
@@ -46,49 +263,25 @@ class AddressAnalyzer:
         Returns:
             地址列表，包含地址和相关统计信息
         """
-        time_filter = ""
         params = {'limit': limit}
         
         if time_range:
-            time_filter = """
-            AND transaction_timestamp >= %(start_time)s
-            """
             params['start_time'] = datetime.now() - time_range
-
-        query = f"""
-        WITH (
-            SELECT address, sum(value) as received
-            FROM transactions
-            WHERE to_address = address
-            {time_filter}
-            GROUP BY address
-        ) as inflow,
-        (
-            SELECT from_address as address, sum(value) as sent
-            FROM transactions
-            WHERE from_address = address
-            {time_filter}
-            GROUP BY address
-        ) as outflow
-        SELECT 
-            COALESCE(inflow.address, outflow.address) as address,
-            COALESCE(inflow.received, 0) - COALESCE(outflow.sent, 0) as net_value,
-            COALESCE(inflow.received, 0) as total_received,
-            COALESCE(outflow.sent, 0) as total_sent
-        FROM inflow
-        FULL OUTER JOIN outflow ON inflow.address = outflow.address
-        ORDER BY net_value DESC
-        LIMIT %(limit)s
-        """
+            query = self._TOP_ADDR_SQL_TIMED
+        else:
+            query = self._TOP_ADDR_SQL_NO_TIME
         
-        results = self.clickhouse_client.execute(query, params)
+        with self._client() as client:
+            results = client.execute(
+                query, params, settings=self._QUERY_SETTINGS
+            )
         
         return [
             {
                 'address': row[0],
-                'net_value': float(row[1]),
-                'total_received': float(row[2]),
-                'total_sent': float(row[3])
+                'net_value': int(row[1]),
+                'total_received': int(row[2]),
+                'total_sent': int(row[3])
             }
             for row in results
         ]
@@ -106,151 +299,214 @@ class AddressAnalyzer:
         Returns:
             地址活动模式分析结果
         """
+        cache_key = (address, int(time_window.total_seconds()))
+        cached = self._get_cached_pattern(cache_key)
+        if cached is not None:
+            return cached
+
         start_time = datetime.now() - time_window
         
-        query = """
-        SELECT
-            toStartOfHour(transaction_timestamp) as hour,
-            count() as tx_count,
-            sum(case when from_address = %(address)s then 1 else 0 end) as out_tx_count,
-            sum(case when to_address = %(address)s then 1 else 0 end) as in_tx_count,
-            sum(case when from_address = %(address)s then value else 0 end) as out_value,
-            sum(case when to_address = %(address)s then value else 0 end) as in_value
-        FROM transactions
-        WHERE (from_address = %(address)s OR to_address = %(address)s)
-            AND transaction_timestamp >= %(start_time)s
-        GROUP BY hour
-        ORDER BY hour
-        """
+        # 按列取回结果，直接用NumPy数组计算统计信息
+        with self._client() as client:
+            columns = client.execute(
+                self._ACTIVITY_PATTERN_SQL,
+                {
+                    'address': address,
+                    'start_time': start_time
+                },
+                settings=self._QUERY_SETTINGS,
+                columnar=True
+            )
         
-        results = self.clickhouse_client.execute(
-            query,
-            {
-                'address': address,
-                'start_time': start_time
-            }
-        )
+        if columns:
+            hours, tx_count, _, _, out_value, in_value = (np.asarray(col) for col in columns)
+        else:
+            hours = tx_count = out_value = in_value = np.empty(0)
+        stats = self._summarize_activity(hours, tx_count, out_value, in_value)
         
-        # 转换为pandas DataFrame进行时间序列分析
-        df = pd.DataFrame(results, columns=[
-            'hour', 'tx_count', 'out_tx_count', 'in_tx_count',
-            'out_value', 'in_value'
-        ])
+        self._cache_pattern(cache_key, stats)
+        return stats
+
+    @staticmethod
+    def _summarize_activity(hours: np.ndarray,
+                            tx_count: np.ndarray,
+                            out_value: np.ndarray,
+                            in_value: np.ndarray) -> Dict[str, Any]:
+        """根据按小时聚合的交易数据计算活动模式统计信息
+
+        Args:
+            hours: 每行对应的小时
+            tx_count: 每小时交易数
+            out_value: 每小时转出金额（wei）
+            in_value: 每小时转入金额（wei）
+
+        Returns:
+            活动模式统计信息
+        """
+        if len(tx_count) == 0:
+            return {
+                'total_transactions': 0,
+                'avg_daily_transactions': 0.0,
+                'total_outgoing': 0,
+                'total_incoming': 0,
+                'net_flow': 0,
+                'active_hours': 0,
+                'most_active_hour': None,
+                'max_hourly_transactions': 0
+            }
+
+        total_outgoing = int(out_value.sum())
+        total_incoming = int(in_value.sum())
+        max_idx = int(tx_count.argmax())
         
-        # 计算基本统计信息
-        stats = {
-            'total_transactions': int(df['tx_count'].sum()),
-            'avg_daily_transactions': float(df['tx_count'].mean() * 24),
-            'total_outgoing': float(df['out_value'].sum()),
-            'total_incoming': float(df['in_value'].sum()),
-            'net_flow': float(df['in_value'].sum() - df['out_value'].sum()),
-            'active_hours': len(df[df['tx_count'] > 0]),
-            'most_active_hour': df.loc[df['tx_count'].idxmax(), 'hour'].strftime('%Y-%m-%d %H:00:00'),
-            'max_hourly_transactions': int(df['tx_count'].max())
+        return {
+            'total_transactions': int(tx_count.sum()),
+            'avg_daily_transactions': float(tx_count.mean() * 24),
+            'total_outgoing': total_outgoing,
+            'total_incoming': total_incoming,
+            'net_flow': total_incoming - total_outgoing,
+            'active_hours': int(np.count_nonzero(tx_count)),
+            'most_active_hour': hours[max_idx].strftime('%Y-%m-%d %H:00:00'),
+            'max_hourly_transactions': int(tx_count[max_idx])
         }
-        
-        return stats
+
+    def _get_activity_patterns(self,
+                               addresses: List[str],
+                               time_window: timedelta = timedelta(days=30)
+                               ) -> Dict[str, Dict[str, Any]]:
+        """批量分析多个地址的活动模式
+
+        与 get_address_activity_pattern 的统计口径一致，但只发起一次查询。
+
+        Args:
+            addresses: 要分析的地址列表
+            time_window: 分析的时间窗口
+
+        Returns:
+            地址到活动模式的映射，时间窗口内无交易的地址不包含在结果中
+        """
+        window_seconds = int(time_window.total_seconds())
+        patterns = {}
+        missing = []
+        for addr in addresses:
+            cached = self._get_cached_pattern((addr, window_seconds))
+            if cached is not None:
+                patterns[addr] = cached
+            else:
+                missing.append(addr)
+        if not missing:
+            return patterns
+
+        start_time = datetime.now() - time_window
+
+        # 流式读取结果：按地址逐段汇总，不在内存中保留完整结果集
+        with self._client() as client:
+            chunks = client.execute_iter(
+                self._BATCH_ACTIVITY_PATTERN_SQL,
+                {
+                    'addresses': tuple(missing),
+                    'start_time': start_time
+                },
+                settings=self._QUERY_SETTINGS,
+                chunk_size=self._STREAM_CHUNK_SIZE
+            )
+            # chunk_size > 1 时 execute_iter 按块返回行列表，先展开为逐行
+            rows = chain.from_iterable(chunks)
+            # 结果按地址排序，每个地址的小时记录是连续的一段
+            for addr, group in groupby(rows, key=itemgetter(0)):
+                _, hours, tx_count, _, _, out_value, in_value = (
+                    np.asarray(col) for col in zip(*group)
+                )
+                patterns[addr] = self._summarize_activity(hours, tx_count, out_value, in_value)
+                self._cache_pattern((addr, window_seconds), patterns[addr])
+
+        return patterns
 
     def find_similar_addresses(self, 
                              address: str, 
-                             min_similarity: float = 0.7,
+                             min_similarity: float = 0.82,
                              limit: int = 10) -> List[Dict[str, Any]]:
         """查找具有相似交易模式的地址
 
         Args:
             address: 目标地址
-            min_similarity: 最小相似度阈值
+            min_similarity: 最小相似度阈值，取值含义见 _calculate_pattern_similarity
             limit: 返回结果数量
 
         Returns:
             相似地址列表
         """
-        # 获取目标地址的交易模式
-        target_pattern = self.get_address_activity_pattern(address)
-        
-        # 查找交易量相近的地址
-        query = """
-        WITH (
-            SELECT count() as tx_count
-            FROM transactions
-            WHERE from_address = %(address)s OR to_address = %(address)s
-        ) as target_count
-        
-        SELECT 
-            address,
-            tx_count,
-            abs(tx_count - target_count) / target_count as difference
-        FROM (
-            SELECT
-                address,
-                count() as tx_count
-            FROM (
-                SELECT from_address as address
-                FROM transactions
-                WHERE from_address != %(address)s
-                UNION ALL
-                SELECT to_address as address
-                FROM transactions
-                WHERE to_address != %(address)s
+        # 目标地址的活动模式与候选地址查询互不依赖，并发执行
+        target_future = self._executor.submit(self.get_address_activity_pattern, address)
+        with self._client() as client:
+            results = client.execute(
+                self._SIMILAR_CANDIDATES_SQL,  # 查找交易量相近的地址
+                {
+                    'address': address,
+                    'limit': limit * 2  # 获取更多候选地址进行详细比较
+                },
+                settings=self._QUERY_SETTINGS
             )
-            GROUP BY address
-            HAVING tx_count >= target_count * 0.5
-                AND tx_count <= target_count * 1.5
+        target_pattern = target_future.result()
+        
+        cand_addrs = [row[0] for row in results]
+        if not cand_addrs or not target_pattern['total_transactions']:
+            return []
+
+        # 一次批量查询取回所有候选地址的活动模式，避免逐个地址查询
+        patterns = self._get_activity_patterns(cand_addrs)
+
+        candidates = [(addr, patterns[addr]) for addr in cand_addrs if addr in patterns]
+        if not candidates:
+            return []
+
+        # 一次性计算所有候选地址的相似度
+        scores = self._calculate_pattern_similarity(
+            target_pattern, [pattern for _, pattern in candidates]
         )
-        ORDER BY difference ASC
-        LIMIT %(limit)s
-        """
         
-        results = self.clickhouse_client.execute(
-            query,
+        # 按相似度排序、过滤并限制返回数量
+        order = np.argsort(-scores, kind='stable')
+        order = order[scores[order] >= min_similarity][:limit]
+        return [
             {
-                'address': address,
-                'limit': limit * 2  # 获取更多候选地址进行详细比较
+                'address': candidates[i][0],
+                'similarity': float(scores[i]),
+                'pattern': candidates[i][1]
             }
-        )
-        
-        similar_addresses = []
-        for row in results:
-            candidate_address = row[0]
-            candidate_pattern = self.get_address_activity_pattern(candidate_address)
-            
-            # 计算相似度
-            similarity = self._calculate_pattern_similarity(target_pattern, candidate_pattern)
-            
-            if similarity >= min_similarity:
-                similar_addresses.append({
-                    'address': candidate_address,
-                    'similarity': similarity,
-                    'pattern': candidate_pattern
-                })
-        
-        # 按相似度排序并限制返回数量
-        similar_addresses.sort(key=lambda x: x['similarity'], reverse=True)
-        return similar_addresses[:limit]
+            for i in order
+        ]
 
     def _calculate_pattern_similarity(self, 
-                                   pattern1: Dict[str, Any], 
-                                   pattern2: Dict[str, Any]) -> float:
-        """计算两个地址模式的相似度
+                                   target_pattern: Dict[str, Any], 
+                                   candidate_patterns: List[Dict[str, Any]]) -> np.ndarray:
+        """计算目标地址模式与各候选地址模式的相似度
+
+        每个特征的相似度为 1 - |a-b| / (|a|+|b|)，按 0.4/0.3/0.3 加权。
+        该分母比旧的 max(|a|, |b|) 更宽松：同号时旧分数 r 对应新分数 2r/(1+r)，
+        例如 a=1、b=3 旧分数为0.33，新分数为0.5；旧阈值0.7约对应新阈值0.82，
+        find_similar_addresses 的默认阈值已按此调整。
 
         Args:
-            pattern1: 第一个地址的模式
-            pattern2: 第二个地址的模式
+            target_pattern: 目标地址的模式
+            candidate_patterns: 候选地址的模式列表
 
         Returns:
-            相似度分数 (0-1)
+            与 candidate_patterns 一一对应的相似度分数数组 (0-1)
         """
-        # 计算交易量相似度
-        tx_similarity = 1 - abs(pattern1['avg_daily_transactions'] - pattern2['avg_daily_transactions']) / \
-                           max(pattern1['avg_daily_transactions'], pattern2['avg_daily_transactions'])
-        
-        # 计算活跃时间相似度
-        time_similarity = 1 - abs(pattern1['active_hours'] - pattern2['active_hours']) / \
-                             max(pattern1['active_hours'], pattern2['active_hours'])
+        # 特征依次为: 交易量、活跃时间、交易金额模式；金额以整数wei保存，在此统一转为浮点
+        target = np.array([
+            target_pattern['avg_daily_transactions'],
+            target_pattern['active_hours'],
+            target_pattern['net_flow']
+        ], dtype=float)
+        cands = np.array([
+            [p['avg_daily_transactions'], p['active_hours'], p['net_flow']]
+            for p in candidate_patterns
+        ], dtype=float).reshape(-1, 3)
         
-        # 计算交易金额模式相似度
-        value_similarity = 1 - abs(pattern1['net_flow'] - pattern2['net_flow']) / \
-                             max(abs(pattern1['net_flow']), abs(pattern2['net_flow']))
+        # |a-b| / (|a|+|b|) 落在 [0, 1]，无需分支；eps 使两者均为0时相似度为1
+        sims = 1.0 - np.abs(cands - target) / (np.abs(cands) + np.abs(target) + 1e-12)
         
         # 综合评分
-        return (tx_similarity * 0.4 + time_similarity * 0.3 + value_similarity * 0.3) 
\ No newline at end of file
+        return sims @ np.array([0.4, 0.3, 0.3]) 
\ No newline at end of file
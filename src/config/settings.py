@@ -6,7 +6,34 @@
 
 import os
 import yaml
-from typing import Dict, Any
+from types import MappingProxyType
+from typing import Dict, Any, Final, Mapping
+
+# C扩展可用时使用更快的 CSafeLoader
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+# 默认配置，模块加载时构建一次；各节包装为只读视图，防止被调用方修改
+_DEFAULT_CONFIG: Final[Mapping[str, Mapping[str, Any]]] = MappingProxyType({
+    section: MappingProxyType(defaults) for section, defaults in {
+    'clickhouse': {
+        'host': 'localhost',
+        'port': 9000,
+        'user': 'default',
+        'password': '',
+        'database': 'ethereum'
+    },
+    'analysis': {
+        'cache_enabled': True,
+        'cache_ttl': 3600,  # 缓存过期时间（秒）
+        'batch_size': 1000,  # 批处理大小
+        'max_workers': 4     # 最大工作线程数
+    },
+    'logging': {
+        'level': 'INFO',
+        'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    }
+}.items()
+})
 
 class Settings:
     """配置管理类"""
@@ -24,42 +51,28 @@ class Settings:
         self.config = self._load_config()
     
     def _load_config(self) -> Dict[str, Any]:
-        """加载配置文件
+        """加载配置文件，并与默认配置逐节合并
 
         Returns:
             配置字典
         """
-        if not os.path.exists(self.config_path):
-            return self._get_default_config()
-            
-        with open(self.config_path, 'r', encoding='utf-8') as f:
-            return yaml.safe_load(f)
+        user_config = {}
+        if os.path.exists(self.config_path):
+            with open(self.config_path, 'r', encoding='utf-8') as f:
+                user_config = yaml.load(f, Loader=_YAML_LOADER) or {}
+
+        merged = dict(user_config)
+        for section, defaults in self._get_default_config().items():
+            merged[section] = {**defaults, **(user_config.get(section) or {})}
+        return merged
     
-    def _get_default_config(self) -> Dict[str, Any]:
+    def _get_default_config(self) -> Mapping[str, Mapping[str, Any]]:
         """获取默认配置
 
         Returns:
-            默认配置字典
+            默认配置的只读视图（模块级共享，不可修改）
         """
-        return {
-            'clickhouse': {
-                'host': 'localhost',
-                'port': 9000,
-                'user': 'default',
-                'password': '',
-                'database': 'ethereum'
-            },
-            'analysis': {
-                'cache_enabled': True,
-                'cache_ttl': 3600,  # 缓存过期时间（秒）
-                'batch_size': 1000,  # 批处理大小
-                'max_workers': 4     # 最大工作线程数
-            },
-            'logging': {
-                'level': 'INFO',
-                'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-            }
-        }
+        return _DEFAULT_CONFIG
     
     def get_clickhouse_config(self) -> Dict[str, Any]:
         """获取ClickHouse配置
@@ -67,7 +80,7 @@ class Settings:
         Returns:
             ClickHouse配置字典
         """
-        return self.config.get('clickhouse', self._get_default_config()['clickhouse'])
+        return self.config['clickhouse']
     
     def get_analysis_config(self) -> Dict[str, Any]:
         """获取分析配置
@@ -75,7 +88,7 @@ class Settings:
         Returns:
             分析配置字典
         """
-        return self.config.get('analysis', self._get_default_config()['analysis'])
+        return self.config['analysis']
     
     def get_logging_config(self) -> Dict[str, Any]:
         """获取日志配置
@@ -83,4 +96,4 @@ class Settings:
         Returns:
             日志配置字典
         """
-        return self.config.get('logging', self._get_default_config()['logging']) 
\ No newline at end of file
+        return self.config['logging'] 
\ No newline at end of file
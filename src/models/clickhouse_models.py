@@ -4,12 +4,13 @@
 ClickHouse数据模型 - 存储区块链原始数据
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from datetime import datetime
+from operator import attrgetter
 from typing import List, Optional
 from decimal import Decimal
 
-@dataclass
+@dataclass(slots=True)
 class Block:
     """区块数据模型"""
     number: int
@@ -63,7 +64,7 @@ class Block:
         ORDER BY (number)
         """
 
-@dataclass
+@dataclass(slots=True)
 class Transaction:
     """交易数据模型"""
     hash: str
@@ -98,12 +99,85 @@ class Transaction:
             type UInt8,
             max_fee_per_gas Nullable(UInt64),
             max_priority_fee_per_gas Nullable(UInt64),
-            transaction_timestamp DateTime
+            transaction_timestamp DateTime,
+            INDEX idx_timestamp transaction_timestamp TYPE minmax GRANULARITY 4,
+            INDEX idx_from from_address TYPE bloom_filter(0.01) GRANULARITY 4,
+            INDEX idx_to to_address TYPE bloom_filter(0.01) GRANULARITY 4,
+            PROJECTION by_from (
+                SELECT from_address, to_address, value, transaction_timestamp
+                ORDER BY (from_address, transaction_timestamp)
+            ),
+            PROJECTION by_to (
+                SELECT from_address, to_address, value, transaction_timestamp
+                ORDER BY (to_address, transaction_timestamp)
+            )
         ) ENGINE = MergeTree()
         ORDER BY (block_number, transaction_index)
+        SETTINGS allow_nullable_key = 1
         """
 
-@dataclass
+    @classmethod
+    def add_indexes_sql(cls) -> List[str]:
+        """为已有的 transactions 表补建跳数索引，并为存量数据构建索引"""
+        indexes = [
+            ("idx_timestamp", "transaction_timestamp TYPE minmax GRANULARITY 4"),
+            ("idx_from", "from_address TYPE bloom_filter(0.01) GRANULARITY 4"),
+            ("idx_to", "to_address TYPE bloom_filter(0.01) GRANULARITY 4"),
+        ]
+        statements = []
+        for name, definition in indexes:
+            statements.append(f"ALTER TABLE transactions ADD INDEX IF NOT EXISTS {name} {definition}")
+            statements.append(f"ALTER TABLE transactions MATERIALIZE INDEX {name}")
+        return statements
+
+    @classmethod
+    def add_projections_sql(cls) -> List[str]:
+        """为已有的 transactions 表补建按地址排序的投影，并为存量数据构建投影
+
+        缺少投影时，按地址拆分的 UNION ALL 查询会退化为两次全表扫描。
+        """
+        projections = [
+            ("by_from", "from_address"),
+            ("by_to", "to_address"),
+        ]
+        statements = [
+            # to_address 为 Nullable，作为投影排序键需要开启该设置
+            "ALTER TABLE transactions MODIFY SETTING allow_nullable_key = 1"
+        ]
+        for name, key in projections:
+            statements.append(
+                f"ALTER TABLE transactions ADD PROJECTION IF NOT EXISTS {name} ("
+                f"SELECT from_address, to_address, value, transaction_timestamp "
+                f"ORDER BY ({key}, transaction_timestamp))"
+            )
+            statements.append(f"ALTER TABLE transactions MATERIALIZE PROJECTION {name}")
+        return statements
+
+    @classmethod
+    def prepare_batch(cls, rows: List['Transaction']) -> List[tuple]:
+        """整理一批待写入的交易
+
+        按 hash 去重（保留最后一条），按主键 (block_number, transaction_index) 排序，
+        并按表的列顺序转换为元组。写入前已有序，ClickHouse 无需再对数据块排序。
+        批大小建议与配置中的 batch_size（默认1000）一致。
+
+        用法::
+
+            client.execute('INSERT INTO transactions VALUES',
+                           Transaction.prepare_batch(batch), types_check=False)
+
+        Args:
+            rows: 待写入的交易列表
+
+        Returns:
+            可直接传给 clickhouse-driver 的行元组列表
+        """
+        latest = {row.hash: row for row in rows}
+        ordered = sorted(latest.values(), key=attrgetter('block_number', 'transaction_index'))
+        to_tuple = attrgetter(*(f.name for f in fields(cls)))
+        return [to_tuple(row) for row in ordered]
+
+@dataclass(slots=True)
 class AddressStats:
     """地址统计数据模型"""
     address: str
@@ -122,9 +196,51 @@ class AddressStats:
             total_transactions UInt64,
             total_received Decimal128(0),
             total_sent Decimal128(0),
-            first_seen DateTime,
-            last_seen DateTime,
-            is_contract Boolean
-        ) ENGINE = MergeTree()
+            first_seen SimpleAggregateFunction(min, DateTime),
+            last_seen SimpleAggregateFunction(max, DateTime),
+            is_contract SimpleAggregateFunction(max, Boolean)
+        ) ENGINE = SummingMergeTree((total_transactions, total_received, total_sent))
         ORDER BY (address)
-        """ 
\ No newline at end of file
+        """
+
+    @classmethod
+    def create_mv_sql(cls) -> str:
+        """由 transactions 增量维护 address_stats 的物化视图"""
+        return f"""
+        CREATE MATERIALIZED VIEW IF NOT EXISTS address_stats_mv TO address_stats AS
+        {cls._source_select_sql()}
+        """
+
+    @classmethod
+    def backfill_sql(cls) -> str:
+        """用已有交易数据初始化 address_stats（物化视图只处理创建之后写入的数据）
+
+        只回填 block_number < %(before_block)s 的交易，避免与物化视图重复计数或遗漏。
+        执行顺序：先执行 create_mv_sql() 创建视图，记录视图创建后第一批写入的
+        起始区块号（prepare_batch() 排序后的第一行），再以该区块号作为 before_block
+        执行本语句。要求写入按整个区块分批，同一区块不会跨越视图创建前后两次写入。
+        """
+        return f"""
+        INSERT INTO address_stats
+        {cls._source_select_sql('block_number < %(before_block)s')}
+        """
+
+    @classmethod
+    def _source_select_sql(cls, extra_predicate: str = '') -> str:
+        # 每笔交易展开为收款方/付款方两条记录；单条 SELECT 保证物化视图只由 transactions 的插入触发一次
+        return """
+        SELECT
+            leg.1 AS address,
+            toUInt64(1) AS total_transactions,
+            leg.2 AS total_received,
+            leg.3 AS total_sent,
+            transaction_timestamp AS first_seen,
+            transaction_timestamp AS last_seen,
+            false AS is_contract
+        FROM transactions
+        ARRAY JOIN [
+            (assumeNotNull(to_address), value, toDecimal128(0, 0)),
+            (from_address, toDecimal128(0, 0), value)
+        ] AS leg
+        WHERE leg.1 != ''
+        """ + (f"    AND {extra_predicate}\n        " if extra_predicate else "") 
\ No newline at end of file
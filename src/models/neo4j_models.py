@@ -4,9 +4,9 @@
 Neo4j数据模型 - 存储区块链关系数据
 """
 
-from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional, Dict
+from functools import lru_cache
+from typing import List, Optional, Dict, Tuple
 from enum import Enum
 
 class NodeLabel(Enum):
@@ -26,40 +26,80 @@ class RelationType(Enum):
     INTERACTS_WITH = "INTERACTS_WITH"  # Address -> Contract
     CREATED_CONTRACT = "CREATED_CONTRACT"  # Address -> Contract
 
-@dataclass
+@lru_cache(maxsize=64)
+def _node_template(label: str, keys: Tuple[str, ...]) -> str:
+    """按 (标签, 属性名) 缓存创建节点的Cypher模板"""
+    props = ", ".join(f"{k}: ${k}" for k in keys)
+    return f"CREATE (n:{label} {{{props}}}) RETURN n"
+
+@lru_cache(maxsize=64)
+def _relationship_template(rel_type: str, from_label: str, to_label: str,
+                           keys: Tuple[str, ...]) -> str:
+    """按 (关系类型, 两端标签, 属性名) 缓存创建关系的Cypher模板"""
+    props = ""
+    if keys:
+        props = " {" + ", ".join(f"{k}: ${k}" for k in keys) + "}"
+    return f"""
+        MATCH (from:{from_label} {{hash: $from_hash}})
+        MATCH (to:{to_label} {{hash: $to_hash}})
+        CREATE (from)-[r:{rel_type}{props}]->(to)
+        RETURN r
+        """
+
 class Neo4jNode:
     """Neo4j节点基类"""
-    label: NodeLabel
-    properties: Dict
+    __slots__ = ('label', 'properties')
+
+    def __init__(self, label: NodeLabel, properties: Dict):
+        self.label = label
+        self.properties = properties
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(label={self.label!r}, properties={self.properties!r})"
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return (self.label, self.properties) == (other.label, other.properties)
 
     def to_cypher_create(self) -> str:
         """生成创建节点的Cypher语句"""
-        props = ", ".join(f"{k}: ${k}" for k in self.properties.keys())
-        return f"CREATE (n:{self.label.value} {{{props}}}) RETURN n"
+        return _node_template(self.label.value, tuple(self.properties.keys()))
 
-@dataclass
 class Neo4jRelationship:
     """Neo4j关系基类"""
-    type: RelationType
-    from_node: Neo4jNode
-    to_node: Neo4jNode
-    properties: Dict = None
+    __slots__ = ('type', 'from_node', 'to_node', 'properties')
+
+    def __init__(self, type: RelationType, from_node: Neo4jNode, to_node: Neo4jNode,
+                 properties: Dict = None):
+        self.type = type
+        self.from_node = from_node
+        self.to_node = to_node
+        self.properties = properties
+
+    def __repr__(self) -> str:
+        return (f"{type(self).__name__}(type={self.type!r}, from_node={self.from_node!r}, "
+                f"to_node={self.to_node!r}, properties={self.properties!r})")
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+        return ((self.type, self.from_node, self.to_node, self.properties) ==
+                (other.type, other.from_node, other.to_node, other.properties))
 
     def to_cypher_create(self) -> str:
         """生成创建关系的Cypher语句"""
-        props = ""
-        if self.properties:
-            props = " {" + ", ".join(f"{k}: ${k}" for k in self.properties.keys()) + "}"
-        return f"""
-        MATCH (from:{self.from_node.label.value} {{hash: $from_hash}})
-        MATCH (to:{self.to_node.label.value} {{hash: $to_hash}})
-        CREATE (from)-[r:{self.type.value}{props}]->(to)
-        RETURN r
-        """
+        return _relationship_template(
+            self.type.value,
+            self.from_node.label.value,
+            self.to_node.label.value,
+            tuple(self.properties.keys()) if self.properties else ()
+        )
 
-@dataclass
 class BlockNode(Neo4jNode):
     """区块节点"""
+    __slots__ = ()
+
     def __init__(self, hash: str, number: int):
         super().__init__(
             label=NodeLabel.BLOCK,
@@ -69,9 +109,10 @@ class BlockNode(Neo4jNode):
             }
         )
 
-@dataclass
 class TransactionNode(Neo4jNode):
     """交易节点"""
+    __slots__ = ()
+
     def __init__(self, hash: str):
         super().__init__(
             label=NodeLabel.TRANSACTION,
@@ -80,9 +121,10 @@ class TransactionNode(Neo4jNode):
             }
         )
 
-@dataclass
 class AddressNode(Neo4jNode):
     """地址节点"""
+    __slots__ = ()
+
     def __init__(self, address: str, is_contract: bool = False):
         super().__init__(
             label=NodeLabel.ADDRESS if not is_contract else NodeLabel.CONTRACT,
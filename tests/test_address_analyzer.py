@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+地址分析器测试
+"""
+
+import queue
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from clickhouse_driver.util.helpers import chunks
+
+from src.analyzers.address_analyzer import AddressAnalyzer
+
+
+class _ChunkedIterClient:
+    """模拟 clickhouse-driver：chunk_size > 1 时 execute_iter 按块返回行列表"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute_iter(self, query, params=None, settings=None, chunk_size=1):
+        rv = iter(self.rows)
+        return chunks(rv, chunk_size) if chunk_size > 1 else rv
+
+    def disconnect(self):
+        pass
+
+
+def _make_analyzer(client, analysis_config=None):
+    # Client 在首次查询时才建立连接，构造后替换连接池为桩客户端即可
+    analyzer = AddressAnalyzer({}, {'max_workers': 1, **(analysis_config or {})})
+    analyzer._clients = [client]
+    analyzer._pool = queue.Queue()
+    analyzer._pool.put(client)
+    return analyzer
+
+
+def test_batched_patterns_handle_chunked_stream(monkeypatch):
+    # 块大小小于行数，保证同一地址的记录跨越块边界
+    monkeypatch.setattr(AddressAnalyzer, '_STREAM_CHUNK_SIZE', 2)
+    rows = [
+        ('0xa', datetime(2024, 1, 1, 1), 2, 1, 1, Decimal(5), Decimal(3)),
+        ('0xa', datetime(2024, 1, 1, 2), 5, 5, 0, Decimal(7), Decimal(0)),
+        ('0xa', datetime(2024, 1, 1, 3), 1, 1, 0, Decimal(1), Decimal(0)),
+        ('0xb', datetime(2024, 1, 1, 3), 1, 0, 1, Decimal(0), Decimal(9)),
+    ]
+    analyzer = _make_analyzer(_ChunkedIterClient(rows))
+
+    patterns = analyzer._get_activity_patterns(['0xa', '0xb', '0xc'])
+
+    assert set(patterns) == {'0xa', '0xb'}
+    assert patterns['0xa']['total_transactions'] == 8
+    assert patterns['0xa']['active_hours'] == 3
+    assert patterns['0xa']['net_flow'] == 3 - 13
+    assert patterns['0xa']['most_active_hour'] == '2024-01-01 02:00:00'
+    assert patterns['0xb']['total_incoming'] == 9
+
+
+class _FailingIterClient(_ChunkedIterClient):
+    """流式读取到一半抛出异常的客户端"""
+
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.disconnected = False
+
+    def execute_iter(self, query, params=None, settings=None, chunk_size=1):
+        yield from super().execute_iter(query, params, settings, chunk_size)
+        raise RuntimeError('connection lost')
+
+    def disconnect(self):
+        self.disconnected = True
+
+
+def test_client_is_reset_when_query_fails():
+    rows = [('0xa', datetime(2024, 1, 1, 1), 1, 1, 0, Decimal(1), Decimal(0))]
+    client = _FailingIterClient(rows)
+    analyzer = _make_analyzer(client)
+
+    try:
+        analyzer._get_activity_patterns(['0xa'])
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError('expected RuntimeError')
+
+    assert client.disconnected
+    assert analyzer._pool.get_nowait() is client
+
+
+def test_pattern_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(AddressAnalyzer, '_PATTERN_CACHE_MAX_SIZE', 2)
+    analyzer = _make_analyzer(_ChunkedIterClient([]))
+
+    for i in range(5):
+        analyzer._cache_pattern((f'0x{i}', 60), {'total_transactions': i})
+
+    assert list(analyzer._pattern_cache) == [('0x3', 60), ('0x4', 60)]
+
+
+def test_pattern_cache_drops_expired_entries_on_write(monkeypatch):
+    analyzer = _make_analyzer(_ChunkedIterClient([]), {'cache_ttl': 10})
+    clock = iter([0.0, 100.0])
+    monkeypatch.setattr('src.analyzers.address_analyzer.time.monotonic', lambda: next(clock))
+
+    analyzer._cache_pattern(('0xa', 60), {'total_transactions': 1})
+    analyzer._cache_pattern(('0xb', 60), {'total_transactions': 2})
+
+    assert list(analyzer._pattern_cache) == [('0xb', 60)]
+
+
+def test_cached_pattern_is_not_shared_with_callers():
+    analyzer = _make_analyzer(_ChunkedIterClient([]))
+    pattern = {'total_transactions': 1}
+    analyzer._cache_pattern(('0xa', 60), pattern)
+
+    pattern['total_transactions'] = 99
+    cached = analyzer._get_cached_pattern(('0xa', 60))
+    cached['total_transactions'] = 42
+
+    assert analyzer._get_cached_pattern(('0xa', 60))['total_transactions'] == 1
+
+
+class _SimilarityStubClient(_ChunkedIterClient):
+    """按查询语句返回目标地址活动、候选地址及候选地址批量活动数据"""
+
+    def __init__(self, target_columns, candidate_rows, batch_rows):
+        super().__init__(batch_rows)
+        self.target_columns = target_columns
+        self.candidate_rows = candidate_rows
+
+    def execute(self, query, params=None, settings=None, columnar=False):
+        if query == AddressAnalyzer._SIMILAR_CANDIDATES_SQL:
+            return self.candidate_rows
+        if query == AddressAnalyzer._ACTIVITY_PATTERN_SQL:
+            return self.target_columns
+        raise AssertionError('unexpected query')
+
+    def execute_iter(self, query, params=None, settings=None, chunk_size=1):
+        assert query == AddressAnalyzer._BATCH_ACTIVITY_PATTERN_SQL
+        self.rows = [row for row in self.rows if row[0] in params['addresses']]
+        return super().execute_iter(query, params, settings, chunk_size)
+
+
+_HOUR = datetime(2024, 1, 1, 1)
+# 目标地址：每小时10笔，净流入100
+_TARGET_COLUMNS = [(_HOUR,), (10,), (5,), (5,), (Decimal(100),), (Decimal(200),)]
+_BATCH_ROWS = [
+    ('0xa', _HOUR, 10, 5, 5, Decimal(100), Decimal(200)),   # 与目标完全一致
+    ('0xb', _HOUR, 5, 2, 3, Decimal(0), Decimal(100)),      # 交易量减半
+    ('0xc', _HOUR, 1, 1, 0, Decimal(100), Decimal(0)),      # 差异大，低于阈值
+]
+_CANDIDATE_ROWS = [('0xc', 1, 0.9), ('0xb', 5, 0.5), ('0xd', 8, 0.2), ('0xa', 10, 0.0)]
+
+
+def _make_similarity_analyzer(target_columns=_TARGET_COLUMNS):
+    return _make_analyzer(_SimilarityStubClient(target_columns, _CANDIDATE_ROWS, _BATCH_ROWS))
+
+
+def test_find_similar_addresses_orders_and_filters():
+    results = _make_similarity_analyzer().find_similar_addresses('0xt', min_similarity=0.7)
+
+    # 0xc 低于阈值被过滤，0xd 窗口内无活动被跳过
+    assert [r['address'] for r in results] == ['0xa', '0xb']
+    assert results[0]['similarity'] == pytest.approx(1.0)
+    assert results[0]['similarity'] > results[1]['similarity'] >= 0.7
+    assert results[1]['pattern']['total_transactions'] == 5
+
+
+def test_find_similar_addresses_truncates_to_limit():
+    results = _make_similarity_analyzer().find_similar_addresses('0xt', min_similarity=0.0, limit=2)
+
+    assert [r['address'] for r in results] == ['0xa', '0xb']
+
+
+def test_find_similar_addresses_returns_empty_for_inactive_target():
+    analyzer = _make_similarity_analyzer(target_columns=[])
+
+    assert analyzer.find_similar_addresses('0xt') == []
+
+
+def _pattern(avg_daily, active_hours, net_flow):
+    return {'avg_daily_transactions': avg_daily, 'active_hours': active_hours, 'net_flow': net_flow}
+
+
+def test_pattern_similarity_all_zero_features_score_one():
+    analyzer = _make_analyzer(_ChunkedIterClient([]))
+    zero = _pattern(0, 0, 0)
+
+    assert analyzer._calculate_pattern_similarity(zero, [zero]) == pytest.approx([1.0])
+
+
+def test_pattern_similarity_opposite_net_flow_stays_in_range():
+    analyzer = _make_analyzer(_ChunkedIterClient([]))
+    scores = analyzer._calculate_pattern_similarity(
+        _pattern(10, 5, -300), [_pattern(10, 5, 100), _pattern(1, 50, 10**24)]
+    )
+
+    assert ((scores >= 0) & (scores <= 1)).all()
+    # 交易量与活跃时间一致，净流向相反：只得到两项特征的权重
+    assert scores[0] == pytest.approx(0.7)
+
+
+def test_pattern_similarity_weights():
+    analyzer = _make_analyzer(_ChunkedIterClient([]))
+    target = _pattern(1, 1, 1)
+    scores = analyzer._calculate_pattern_similarity(target, [
+        _pattern(1, 0, -1),   # 仅交易量一致
+        _pattern(0, 1, -1),   # 仅活跃时间一致
+        _pattern(0, 0, 1),    # 仅交易金额模式一致
+        _pattern(3, 3, 3),    # 各特征 a=1、b=3
+    ])
+
+    assert scores == pytest.approx([0.4, 0.3, 0.3, 0.5])
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ClickHouse数据模型测试
+"""
+
+import re
+from datetime import datetime
+from decimal import Decimal
+
+from src.models.clickhouse_models import AddressStats, Transaction
+
+
+def _tx(hash, block_number, transaction_index, value=0):
+    return Transaction(
+        hash=hash, block_number=block_number, from_address='0xa', to_address='0xb',
+        value=Decimal(value), gas=21000, gas_price=1, input='0x', nonce=0,
+        transaction_index=transaction_index, type=2,
+        transaction_timestamp=datetime(2024, 1, 1),
+    )
+
+
+def _table_columns(create_sql):
+    """按 CREATE TABLE 中的定义顺序取出列名（跳过索引和投影）"""
+    return re.findall(r'^\s+([a-z_]+) [A-Z]', create_sql, re.M)
+
+
+def test_prepare_batch_dedups_and_sorts_by_primary_key():
+    rows = [_tx('0x2', 11, 0), _tx('0x1', 10, 5, value=1), _tx('0x3', 10, 2), _tx('0x1', 10, 5, value=7)]
+
+    batch = Transaction.prepare_batch(rows)
+
+    assert [(row[0], row[1], row[9]) for row in batch] == [('0x3', 10, 2), ('0x1', 10, 5), ('0x2', 11, 0)]
+    # 重复 hash 保留最后一条
+    assert batch[1][4] == Decimal(7)
+
+
+def test_prepare_batch_tuple_order_matches_table_columns():
+    columns = _table_columns(Transaction.create_table_sql())
+    assert columns[0] == 'hash' and columns[-1] == 'transaction_timestamp'
+
+    row = Transaction.prepare_batch([_tx('0x1', 10, 3, value=5)])[0]
+
+    assert dict(zip(columns, row)) == {
+        'hash': '0x1', 'block_number': 10, 'from_address': '0xa', 'to_address': '0xb',
+        'value': Decimal(5), 'gas': 21000, 'gas_price': 1, 'input': '0x', 'nonce': 0,
+        'transaction_index': 3, 'type': 2, 'max_fee_per_gas': None,
+        'max_priority_fee_per_gas': None, 'transaction_timestamp': datetime(2024, 1, 1),
+    }
+    assert len(row) == len(columns)
+
+
+def test_backfill_bounded_below_view_start_block():
+    """回填只覆盖 before_block 之前的区块，物化视图不带区块边界"""
+    assert 'block_number < %(before_block)s' in AddressStats.backfill_sql()
+    assert 'before_block' not in AddressStats.create_mv_sql()
\ No newline at end of file
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Neo4j数据模型测试
+"""
+
+from src.models.neo4j_models import (
+    AddressNode, BlockNode, Neo4jNode, Neo4jRelationship, NodeLabel, RelationType
+)
+
+
+def test_node_eq_requires_same_type():
+    """与 dataclass 生成的 __eq__ 一致：子类实例不等于属性相同的基类实例"""
+    block = BlockNode('0xabc', 1)
+
+    assert block == BlockNode('0xabc', 1)
+    assert block != BlockNode('0xabc', 2)
+    assert block != Neo4jNode(NodeLabel.BLOCK, {'hash': '0xabc', 'number': 1})
+
+
+def test_node_repr():
+    assert repr(AddressNode('0x1')) == (
+        "AddressNode(label=<NodeLabel.ADDRESS: 'Address'>, "
+        "properties={'address': '0x1', 'is_contract': False})"
+    )
+
+
+def test_relationship_eq_and_repr():
+    from_node, to_node = AddressNode('0x1'), AddressNode('0x2')
+    rel = Neo4jRelationship(RelationType.SENT, from_node, to_node, {'value': 1})
+
+    assert rel == Neo4jRelationship(RelationType.SENT, AddressNode('0x1'), AddressNode('0x2'), {'value': 1})
+    assert rel != Neo4jRelationship(RelationType.SENT, from_node, to_node, {'value': 2})
+    assert repr(rel).startswith("Neo4jRelationship(type=<RelationType.SENT: ")
+    assert "from_node=AddressNode(" in repr(rel)
\ No newline at end of file
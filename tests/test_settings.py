@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+配置模块测试
+"""
+
+import pytest
+
+from src.config.settings import Settings
+
+
+def _write_config(tmp_path, text):
+    path = tmp_path / 'config.yaml'
+    path.write_text(text, encoding='utf-8')
+    return str(path)
+
+
+def test_missing_file_uses_defaults(tmp_path):
+    settings = Settings(str(tmp_path / 'missing.yaml'))
+
+    assert settings.get_clickhouse_config()['database'] == 'ethereum'
+    assert settings.get_analysis_config()['max_workers'] == 4
+    assert settings.get_logging_config()['level'] == 'INFO'
+
+
+def test_partial_section_merged_with_defaults(tmp_path):
+    settings = Settings(_write_config(tmp_path, 'analysis:\n  max_workers: 8\n'))
+
+    analysis = settings.get_analysis_config()
+    assert analysis['max_workers'] == 8
+    assert analysis['cache_ttl'] == 3600
+    assert analysis['batch_size'] == 1000
+
+
+def test_empty_section_falls_back_to_defaults(tmp_path):
+    """`clickhouse:` 解析为 None 时整节使用默认值"""
+    settings = Settings(_write_config(tmp_path, 'clickhouse:\n'))
+
+    assert settings.get_clickhouse_config()['host'] == 'localhost'
+    assert settings.get_clickhouse_config()['port'] == 9000
+
+
+def test_unknown_section_survives_merge(tmp_path):
+    settings = Settings(_write_config(tmp_path, 'neo4j:\n  uri: bolt://localhost:7687\n'))
+
+    assert settings.config['neo4j'] == {'uri': 'bolt://localhost:7687'}
+    assert settings.get_clickhouse_config()['database'] == 'ethereum'
+
+
+def test_defaults_are_read_only(tmp_path):
+    settings = Settings(str(tmp_path / 'missing.yaml'))
+    settings.get_analysis_config()['max_workers'] = 16
+
+    defaults = settings._get_default_config()
+    assert defaults['analysis']['max_workers'] == 4
+    with pytest.raises(TypeError):
+        defaults['analysis']['max_workers'] = 16
+    with pytest.raises(TypeError):
+        defaults['extra'] = {}
\ No newline at end of file